@@ -0,0 +1 @@
+# Make `src.*` importable when running pytest from the project root.
@@ -0,0 +1,24 @@
+# Gunicorn settings for the multi-process serving mode.
+# Run: gunicorn -c gunicorn.conf.py src.api.app:app
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# uvicorn.workers is deprecated; the worker class lives in the uvicorn-worker package
+worker_class = "uvicorn_worker.UvicornWorker"
+
+
+def _available_cpus() -> int:
+    # sched_getaffinity honours container CPU limits but only exists on Linux
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# One worker per CPU available to this container unless WEB_CONCURRENCY is set
+workers = int(os.getenv("WEB_CONCURRENCY", _available_cpus()))
+# Shared-nothing: each worker imports the app after fork and builds its own
+# Postgres pool, Redis client and ClickHouse connections in the lifespan
+preload_app = False
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+accesslog = "-"
@@ -0,0 +1,118 @@
+"""Micro-benchmark: CPU time per /search and /person response body.
+
+Compares the previous stdlib-json rendering (Starlette `JSONResponse`) with
+orjson in row and columnar shapes, then the cost and size of each response
+compression available in this environment. No services are needed.
+
+Usage:
+  python scripts/bench_serialization.py [--rows 500] [--iterations 200]
+"""
+import argparse
+import gzip
+import json
+import random
+import string
+import time
+
+import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SEARCH_COLUMNS = ["id", "person_name", "person_title", "person_email", "score"]
+PERSON_COLUMN_COUNT = 39
+
+
+def _word(rng: random.Random, n: int) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(n))
+
+
+def make_rows(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        (
+            "%024x" % rng.getrandbits(96),
+            f"{_word(rng, 6).title()} {_word(rng, 8).title()}",
+            rng.choice(["Software Engineer", "CTO", "Account Executive", "Data Analyst", None]),
+            f"{_word(rng, 7)}@{_word(rng, 6)}.com",
+            str(rng.randint(0, 100)),
+        )
+        for _ in range(n)
+    ]
+
+
+def stdlib_render(content) -> bytes:
+    # Mirrors starlette.responses.JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_render(content) -> bytes:
+    # Mirrors fastapi.responses.ORJSONResponse.render
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def cpu_per_call(fn, iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    meta = {"count": len(rows), "total_records": 100000, "page": 1, "limit": args.rows, "credits_used": 1, "exec_ms": 12}
+    person_columns = [f"col_{i}" for i in range(PERSON_COLUMN_COUNT)]
+    person_row = tuple(_word(random.Random(i), 16) for i in range(PERSON_COLUMN_COUNT))
+
+    cases = {
+        "search rows  (stdlib json)": lambda: stdlib_render({"results": [dict(zip(SEARCH_COLUMNS, r)) for r in rows], **meta}),
+        "search rows  (orjson)": lambda: orjson_render({"results": [dict(zip(SEARCH_COLUMNS, r)) for r in rows], **meta}),
+        "search columns (orjson)": lambda: orjson_render({"columns": SEARCH_COLUMNS, "rows": rows, **meta}),
+        "person       (stdlib json)": lambda: stdlib_render({"record": dict(zip(person_columns, person_row)), "exec_ms": 5}),
+        "person       (orjson)": lambda: orjson_render({"record": dict(zip(person_columns, person_row)), "exec_ms": 5}),
+    }
+    print(f"Serialization, {args.rows} rows, {args.iterations} iterations")
+    for name, fn in cases.items():
+        body = fn()
+        print(f"  {name:<28} {cpu_per_call(fn, args.iterations) * 1e6:9.1f} us/response  {len(body):8d} bytes")
+
+    body = cases["search rows  (orjson)"]()
+    compressors = {"gzip (level 3)": lambda: gzip.compress(body, compresslevel=3)}
+    if brotli is not None:
+        compressors["br (quality 4)"] = lambda: brotli.compress(body, quality=4)
+    if zstandard is not None:
+        zstd = zstandard.ZstdCompressor(level=3)
+        compressors["zstd (level 3)"] = lambda: zstd.compress(body)
+    print(f"Compression of the {len(body)}-byte search body")
+    compress_cost = {}
+    for name, fn in compressors.items():
+        compress_cost[name] = cpu_per_call(fn, args.iterations)
+        print(f"  {name:<28} {compress_cost[name] * 1e6:9.1f} us/response  {len(fn()):8d} bytes")
+
+    # Before: stdlib json, uncompressed. After: orjson plus the negotiated encoding.
+    # Compression often costs more CPU than orjson saves; the API runs it in a
+    # worker thread for large bodies so it does not block the event loop.
+    before = cpu_per_call(cases["search rows  (stdlib json)"], args.iterations)
+    after = cpu_per_call(cases["search rows  (orjson)"], args.iterations)
+    print("Search rows response, total CPU (serialize + compress)")
+    print(f"  {'before: stdlib json':<28} {before * 1e6:9.1f} us/response")
+    print(f"  {'after: orjson, identity':<28} {after * 1e6:9.1f} us/response")
+    for name, cost in compress_cost.items():
+        label = f"after: orjson + {name.split()[0]}"
+        print(f"  {label:<28} {(after + cost) * 1e6:9.1f} us/response")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# One-off upgrade step for ClickHouse request logs. This script:
+# 1) Creates analytics.api_logs and its usage rollup (sql/clickhouse_api_logs.sql);
+#    the ClickHouse init directory only runs on a fresh volume
+# 2) Copies Postgres api_logs rows older than the oldest row already in
+#    ClickHouse (i.e. the history from before the API started mirroring)
+# 3) Verifies row counts
+#
+# Safe to re-run: each run only copies rows older than what ClickHouse holds.
+# Enable the Postgres purge (API_LOGS_PG_RETENTION_DAYS) only after this succeeds.
+
+ROOT_DIR=$(cd "$(dirname "$0")/.." && pwd)
+PG_USER=${PG_USER:-admin}
+PG_DB=${PG_DB:-credits_db}
+
+echo "Creating analytics.api_logs and analytics.api_usage_hourly..."
+docker exec -i clickhouse clickhouse-client --multiquery < "$ROOT_DIR/sql/clickhouse_api_logs.sql"
+
+CUTOFF=$(docker exec clickhouse clickhouse-client --query \
+  "SELECT if(count() = 0, '', toString(min(created_at))) FROM analytics.api_logs")
+if [[ -z "$CUTOFF" ]]; then
+  echo "analytics.api_logs is empty; copying all Postgres api_logs rows..."
+  WHERE="true"
+else
+  echo "Copying Postgres api_logs rows older than $CUTOFF UTC..."
+  WHERE="created_at < '$CUTOFF+00'::timestamptz"
+fi
+
+docker exec postgres psql -U "$PG_USER" -d "$PG_DB" -v ON_ERROR_STOP=1 -At -c "COPY (
+  SELECT
+    to_char(created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS.MS'),
+    COALESCE(user_id, 0),
+    COALESCE(endpoint, ''),
+    GREATEST(COALESCE(credits_used, 0), 0),
+    COALESCE(query_params::text, '{}'),
+    GREATEST(COALESCE(execution_time_ms, 0), 0),
+    COALESCE(host(client_ip), '')
+  FROM api_logs
+  WHERE $WHERE
+  ORDER BY created_at
+) TO STDOUT WITH CSV" \
+  | docker exec -i clickhouse clickhouse-client --query \
+    "INSERT INTO analytics.api_logs (created_at, user_id, endpoint, credits_used, query_params, execution_time_ms, client_ip) FORMAT CSV"
+
+echo "Verifying backfill..."
+docker exec postgres psql -U "$PG_USER" -d "$PG_DB" -At -c "SELECT count(*) AS postgres_rows FROM api_logs;"
+docker exec clickhouse clickhouse-client --query "SELECT count() AS clickhouse_rows FROM analytics.api_logs;"
+
+echo "Done."
@@ -4,9 +4,10 @@ set -euo pipefail
 # This script:
 # 1) Starts ClickHouse via docker compose
 # 2) Creates DB and table
-# 3) Copies parquet into container
-# 4) Loads parquet into the table
-# 5) Verifies rows
+# 3) Creates materialized rollups (sql/clickhouse_rollups.sql)
+# 4) Copies parquet into container
+# 5) Loads parquet into the table (populating the rollups)
+# 6) Verifies rows
 
 ROOT_DIR=$(cd "$(dirname "$0")/.." && pwd)
 PARQUET_PATH="$ROOT_DIR/data/processed/ingested.parquet"
@@ -82,6 +83,9 @@ docker exec clickhouse clickhouse-client --multiquery --query "CREATE TABLE IF N
   score Nullable(String)
 ) ENGINE = MergeTree() ORDER BY id;"
 
+echo "Creating materialized rollups..."
+docker exec -i clickhouse clickhouse-client --multiquery < "$ROOT_DIR/sql/clickhouse_rollups.sql"
+
 echo "Copying parquet into container..."
 docker cp "$PARQUET_PATH" clickhouse:/tmp/ingested.parquet
 
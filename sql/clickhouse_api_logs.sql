@@ -0,0 +1,46 @@
+-- clickhouse_api_logs.sql
+-- Request logs for billing and usage analytics, mirrored from the API.
+-- Postgres api_logs keeps only a short window (API_LOGS_PG_RETENTION_DAYS).
+-- Mounted into the ClickHouse init directory by docker-compose.yml; on an
+-- existing volume run scripts/clickhouse_backfill_api_logs.sh, which applies it
+-- and copies the existing Postgres api_logs history.
+
+CREATE DATABASE IF NOT EXISTS analytics;
+
+CREATE TABLE IF NOT EXISTS analytics.api_logs (
+  created_at DateTime64(3, 'UTC'),
+  user_id UInt32,
+  endpoint LowCardinality(String),
+  credits_used UInt16,
+  query_params String,
+  execution_time_ms UInt32,
+  client_ip String
+) ENGINE = MergeTree()
+PARTITION BY toDate(created_at)
+ORDER BY (user_id, endpoint, created_at);
+
+-- Per-user / per-endpoint / per-hour rollup, merged at insert time.
+CREATE TABLE IF NOT EXISTS analytics.api_usage_hourly (
+  hour DateTime('UTC'),
+  user_id UInt32,
+  endpoint LowCardinality(String),
+  requests AggregateFunction(count),
+  credits AggregateFunction(sum, UInt64),
+  latency_ms AggregateFunction(quantiles(0.5, 0.95, 0.99), UInt32),
+  top_queries AggregateFunction(topK(10), String)
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(hour)
+ORDER BY (user_id, endpoint, hour);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.api_usage_hourly_mv
+TO analytics.api_usage_hourly AS
+SELECT
+  toStartOfHour(created_at) AS hour,
+  user_id,
+  endpoint,
+  countState() AS requests,
+  sumState(toUInt64(credits_used)) AS credits,
+  quantilesState(0.5, 0.95, 0.99)(execution_time_ms) AS latency_ms,
+  topKState(10)(query_params) AS top_queries
+FROM analytics.api_logs
+GROUP BY hour, user_id, endpoint;
@@ -0,0 +1,105 @@
+-- clickhouse_rollups.sql
+-- Materialized views kept up to date at insert time on analytics.persons_ingested.
+-- The API detects these tables at startup and routes matching queries to them.
+-- Apply before loading data (scripts/clickhouse_load.sh does this) so inserts populate them.
+-- Applied to an already-loaded table, the INSERT ... SELECT after each view
+-- backfills the existing rows. Each backfill runs only while its rollup is
+-- empty, so re-applying this file is safe. Do not load data while it runs:
+-- rows inserted between a view's creation and its backfill would be counted
+-- twice. The API only routes to a rollup whose row count matches the base table.
+
+-- Search columns re-sorted by country then score: a country-filtered page query
+-- reads only that country's key range, and `ORDER BY score DESC ... LIMIT n`
+-- can stop early (per-country top-N by score) instead of scanning the whole table.
+CREATE TABLE IF NOT EXISTS analytics.persons_by_country (
+  person_location_country String,
+  score Nullable(String),
+  person_name Nullable(String),
+  person_title Nullable(String),
+  person_email Nullable(String),
+  id Nullable(String)
+) ENGINE = MergeTree()
+ORDER BY (person_location_country, score)
+SETTINGS allow_nullable_key = 1;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.persons_by_country_mv
+TO analytics.persons_by_country AS
+SELECT
+  ifNull(person_location_country, '') AS person_location_country,
+  score,
+  person_name,
+  person_title,
+  person_email,
+  id
+FROM analytics.persons_ingested;
+
+INSERT INTO analytics.persons_by_country
+SELECT
+  ifNull(person_location_country, '') AS person_location_country,
+  score,
+  person_name,
+  person_title,
+  person_email,
+  id
+FROM analytics.persons_ingested
+WHERE (SELECT count() FROM analytics.persons_by_country) = 0;
+
+-- Row counts per country / normalized title; a country-only count sums a few rows.
+CREATE TABLE IF NOT EXISTS analytics.persons_country_title_counts (
+  person_location_country String,
+  person_title_normalized String,
+  row_count UInt64
+) ENGINE = SummingMergeTree(row_count)
+ORDER BY (person_location_country, person_title_normalized);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.persons_country_title_counts_mv
+TO analytics.persons_country_title_counts AS
+SELECT
+  ifNull(person_location_country, '') AS person_location_country,
+  ifNull(person_title_normalized, '') AS person_title_normalized,
+  count() AS row_count
+FROM analytics.persons_ingested
+GROUP BY person_location_country, person_title_normalized;
+
+INSERT INTO analytics.persons_country_title_counts
+SELECT
+  ifNull(person_location_country, '') AS person_location_country,
+  ifNull(person_title_normalized, '') AS person_title_normalized,
+  count() AS row_count
+FROM analytics.persons_ingested
+WHERE (SELECT count() FROM analytics.persons_country_title_counts) = 0
+GROUP BY person_location_country, person_title_normalized;
+
+-- Facet rollup for GET /facets: one row per distinct facet combination, merged
+-- at insert time. Facet queries whose filters only pin country and/or email
+-- domain read this table instead of scanning analytics.persons_ingested.
+CREATE TABLE IF NOT EXISTS analytics.persons_facets (
+  person_location_country String,
+  email_domain String,
+  person_seniority String,
+  person_title_normalized String,
+  row_count AggregateFunction(count)
+) ENGINE = AggregatingMergeTree()
+ORDER BY (person_location_country, email_domain, person_seniority, person_title_normalized);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.persons_facets_mv
+TO analytics.persons_facets AS
+SELECT
+  ifNull(person_location_country, '') AS person_location_country,
+  if(position(ifNull(person_email, ''), '@') > 0, splitByChar('@', ifNull(person_email, ''))[-1], '') AS email_domain,
+  ifNull(person_seniority, '') AS person_seniority,
+  ifNull(person_title_normalized, '') AS person_title_normalized,
+  countState() AS row_count
+FROM analytics.persons_ingested
+GROUP BY person_location_country, email_domain, person_seniority, person_title_normalized;
+
+INSERT INTO analytics.persons_facets
+SELECT
+  ifNull(person_location_country, '') AS person_location_country,
+  if(position(ifNull(person_email, ''), '@') > 0, splitByChar('@', ifNull(person_email, ''))[-1], '') AS email_domain,
+  ifNull(person_seniority, '') AS person_seniority,
+  ifNull(person_title_normalized, '') AS person_title_normalized,
+  countState() AS row_count
+FROM analytics.persons_ingested
+WHERE (SELECT count() FROM analytics.persons_facets) = 0
+GROUP BY person_location_country, email_domain, person_seniority, person_title_normalized;
@@ -35,4 +35,7 @@ CREATE TABLE IF NOT EXISTS api_logs (
 -- Optional: index for fast queries by user and created_at
 CREATE INDEX IF NOT EXISTS idx_api_logs_user_created_at ON api_logs(user_id, created_at);
 
+-- Supports the retention purge; long-term log analytics live in ClickHouse (analytics.api_logs)
+CREATE INDEX IF NOT EXISTS idx_api_logs_created_at ON api_logs(created_at);
+
 COMMIT;
@@ -0,0 +1,133 @@
+"""Circuit breakers for the Redis, Postgres and ClickHouse dependencies.
+
+A breaker counts consecutive infrastructure failures (connection errors and
+timeouts, as listed in ``failure_exceptions``). Once ``failure_threshold`` is
+reached it opens, and callers fail fast with `CircuitOpenError` instead of
+waiting out another timeout. After ``reset_timeout`` seconds it goes
+half-open and lets up to ``half_open_max_calls`` probe calls through. One
+success closes it again; one failure re-opens it.
+
+Exceptions listed in ``neutral_exceptions`` (e.g. local pool exhaustion)
+say nothing about the dependency: they neither count as a failure nor close
+the breaker, and a half-open probe that hits one frees its slot.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Tuple, Type
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the breaker is open."""
+
+    def __init__(self, name: str) -> None:
+        super().__init__(f"{name} circuit is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        half_open_max_calls: int = 1,
+        neutral_exceptions: Tuple[Type[BaseException], ...] = (),
+    ) -> None:
+        self.name = name
+        self.failure_exceptions = failure_exceptions
+        self.neutral_exceptions = neutral_exceptions
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def check(self) -> None:
+        """Raise `CircuitOpenError` if a call made now would be rejected.
+
+        Unlike `allow`, this does not take a half-open probe slot, so it can
+        be used to refuse work (e.g. before charging for it) ahead of `guard`.
+        While half-open it rejects once every probe slot is taken.
+        """
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(self.name)
+            if self._state == HALF_OPEN and self._half_open_calls >= self.half_open_max_calls:
+                raise CircuitOpenError(self.name)
+
+    def allow(self) -> bool:
+        """Whether a call may proceed now; half-open admits a bounded number of probes."""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = HALF_OPEN
+                self._half_open_calls = 0
+            if self._state == HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    return False
+                self._half_open_calls += 1
+            return True
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot without recording an outcome."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    @contextmanager
+    def guard(self):
+        """Run the enclosed block under the breaker.
+
+        Raises `CircuitOpenError` without running it when the breaker is open.
+        Exceptions outside ``failure_exceptions`` (e.g. a bad query) mean the
+        dependency answered, so they count as success.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            yield
+        except self.failure_exceptions:
+            self.record_failure()
+            raise
+        except self.neutral_exceptions:
+            self.release_probe()
+            raise
+        except BaseException:
+            self.record_success()
+            raise
+        else:
+            self.record_success()
+
+    def snapshot(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures}
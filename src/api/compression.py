@@ -0,0 +1,147 @@
+"""Response compression negotiated from `Accept-Encoding`.
+
+Supports zstd, brotli and gzip. zstd and brotli are optional: when the
+`zstandard` / `brotli` packages are not installed those encodings are simply
+never offered. Only complete (non-streaming) bodies above `minimum_size` are
+compressed; streamed responses such as `/download` pass through untouched.
+
+Compressing a large body costs about as much CPU as serializing it, so
+bodies of at least `threadpool_min_size` bytes are compressed in a worker
+thread instead of blocking the event loop (and every other request in the
+worker) while it runs.
+"""
+import gzip
+import threading
+from typing import Callable, Dict, Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def _compressors(gzip_level: int, brotli_quality: int, zstd_level: int) -> Dict[str, Callable[[bytes], bytes]]:
+    # Ordered by preference when the client accepts several with equal weight
+    compressors: Dict[str, Callable[[bytes], bytes]] = {}
+    if zstandard is not None:
+        # A ZstdCompressor must not be used by two threads at once
+        local = threading.local()
+
+        def zstd_compress(body: bytes) -> bytes:
+            zstd = getattr(local, "compressor", None)
+            if zstd is None:
+                zstd = local.compressor = zstandard.ZstdCompressor(level=zstd_level)
+            return zstd.compress(body)
+
+        compressors["zstd"] = zstd_compress
+    if brotli is not None:
+        compressors["br"] = lambda body: brotli.compress(body, quality=brotli_quality)
+    compressors["gzip"] = lambda body: gzip.compress(body, compresslevel=gzip_level)
+    return compressors
+
+
+def choose_encoding(accept_encoding: str, available) -> Optional[str]:
+    """Pick the best available encoding from an `Accept-Encoding` header value."""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing buffered responses with zstd, brotli or gzip."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 3,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+        threadpool_min_size: int = 16384,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.threadpool_min_size = threadpool_min_size
+        self.compressors = _compressors(gzip_level, brotli_quality, zstd_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.compressors)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Hold the headers until we know whether the body gets compressed
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compress = self.compressors[encoding]
+            if len(body) >= self.threadpool_min_size:
+                compressed = await anyio.to_thread.run_sync(compress, body)
+            else:
+                compressed = compress(body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,243 @@
+"""Local credit leases for high-volume API keys.
+
+Instead of running the deduction script against `credits:{user_id}` on every
+request, a worker atomically reserves a block of credits from the user's Redis
+balance and spends it from memory. Reserved credits have already left the
+Redis balance, so total spend can never exceed it.
+
+- A block is only leased when the balance covers a full block; smaller
+  balances keep using the per-request Redis path.
+- Leased credits can still be stranded: another worker spending the remaining
+  Redis balance gets 402 while this one holds unused credits. That worker
+  then calls `request_reclaim`, and every worker holding a lease for the
+  user returns it on its next sweep (`start_sweeper`), so a 402 caused by a
+  lease elsewhere clears within one sweep interval.
+- When a lease runs low it is refilled in the background before it runs out.
+- Unused credits go back to Redis when the lease expires (at most
+  `ttl_seconds` after the last refill) and on shutdown, which bounds how far
+  the Redis/Postgres balance can lag actual spend. A worker that dies without
+  shutting down forfeits at most one block per user.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+# Reserve ARGV[1] credits if the balance covers the whole block.
+# Returns {granted, balance_after}; granted is -1 when the key is missing.
+GRANT_LUA = """
+local v = redis.call('GET', KEYS[1])
+if not v then
+  return {-1, 0}
+end
+local n = tonumber(v)
+local block = tonumber(ARGV[1])
+if n >= block then
+  redis.call('DECRBY', KEYS[1], block)
+  return {block, n - block}
+end
+return {0, n}
+"""
+
+# Set (with a TTL) when a worker runs short of a user's credits
+RECLAIM_PREFIX = "lease:reclaim:"
+
+
+@dataclass
+class _Lease:
+    remaining: int = 0
+    expires_at: float = 0.0
+    refilling: bool = False
+
+
+class CreditLeaseManager:
+    """Per-worker credit leases keyed by user id."""
+
+    def __init__(
+        self,
+        redis_client,
+        block: int = 50,
+        ttl_seconds: float = 30.0,
+        low_watermark: int = 10,
+        on_balance: Optional[Callable[[int, int], None]] = None,
+    ) -> None:
+        self.redis = redis_client
+        self.block = block
+        self.ttl_seconds = ttl_seconds
+        self.low_watermark = low_watermark
+        # Called with (user_id, redis_balance) after every grant and return,
+        # e.g. to mirror the balance to Postgres
+        self.on_balance = on_balance
+        self._grant_script = redis_client.register_script(GRANT_LUA)
+        self._leases: Dict[int, _Lease] = {}
+        self._lock = threading.Lock()
+        self._user_locks: Dict[int, threading.Lock] = {}
+
+    def _user_lock(self, user_id: int) -> threading.Lock:
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def _take_local(self, user_id: int, amount: int) -> Optional[bool]:
+        """Spend from the local lease; returns whether a refill should start.
+
+        Returns None when the lease cannot cover ``amount``. Caller holds ``_lock``.
+        """
+        lease = self._leases.get(user_id)
+        if not lease or lease.expires_at <= time.time() or lease.remaining < amount:
+            return None
+        lease.remaining -= amount
+        if lease.remaining <= self.low_watermark and not lease.refilling:
+            lease.refilling = True
+            return True
+        return False
+
+    def _grant(self, user_id: int) -> int:
+        granted, balance = self._grant_script(keys=[f"credits:{user_id}"], args=[self.block])
+        granted = int(granted)
+        if granted > 0:
+            self._notify_balance(user_id, int(balance))
+        return granted
+
+    def _notify_balance(self, user_id: int, balance: int) -> None:
+        if self.on_balance:
+            try:
+                self.on_balance(user_id, balance)
+            except Exception as e:
+                print("credit lease on_balance error", e)
+
+    def _return(self, user_id: int, amount: int) -> None:
+        if amount <= 0:
+            return
+        try:
+            balance = self.redis.incrby(f"credits:{user_id}", amount)
+        except Exception as e:
+            print(f"credit lease return error (user {user_id}, {amount} credits)", e)
+            return
+        self._notify_balance(user_id, int(balance))
+
+    def _add_granted(self, user_id: int, granted: int) -> None:
+        # Caller holds ``_lock``
+        lease = self._leases.setdefault(user_id, _Lease())
+        lease.remaining += granted
+        lease.expires_at = time.time() + self.ttl_seconds
+
+    def _refill(self, user_id: int) -> None:
+        try:
+            with self._user_lock(user_id):
+                with self._lock:
+                    lease = self._leases.get(user_id)
+                    if lease and lease.remaining > self.low_watermark:
+                        return
+                granted = self._grant(user_id)
+                if granted > 0:
+                    with self._lock:
+                        self._add_granted(user_id, granted)
+        except Exception as e:
+            print("credit lease refill error", e)
+        finally:
+            with self._lock:
+                lease = self._leases.get(user_id)
+                if lease:
+                    lease.refilling = False
+
+    def try_consume_local(self, user_id: int, amount: int = 1) -> bool:
+        """Spend ``amount`` credits from a lease this worker already holds.
+
+        Never waits on Redis; a refill, if due, runs in the background.
+        """
+        with self._lock:
+            refill = self._take_local(user_id, amount)
+        if refill is None:
+            return False
+        if refill:
+            threading.Thread(target=self._refill, args=(user_id,), daemon=True).start()
+        return True
+
+    def try_consume(self, user_id: int, amount: int = 1) -> bool:
+        """Spend ``amount`` credits from a local lease, leasing a block if needed.
+
+        Returns False when no lease can be held for this user (missing key or
+        balance below one block); the caller should then use the per-request
+        deduction path. Redis errors propagate to the caller.
+        """
+        if self.try_consume_local(user_id, amount):
+            return True
+
+        with self._user_lock(user_id):
+            # Another thread may have (re)granted while we waited
+            with self._lock:
+                refill = self._take_local(user_id, amount)
+                leftover = 0
+                if refill is None:
+                    lease = self._leases.get(user_id)
+                    if lease and lease.expires_at <= time.time():
+                        leftover = self._leases.pop(user_id).remaining
+            if refill is not None:
+                return True
+            self._return(user_id, leftover)
+            granted = self._grant(user_id)
+            if granted <= 0:
+                return False
+            with self._lock:
+                self._add_granted(user_id, granted)
+                return self._take_local(user_id, amount) is not None
+
+    def request_reclaim(self, user_id: int) -> None:
+        """Ask all workers to return their lease for ``user_id`` on their next sweep.
+
+        Call this when the per-request path runs out of credits for a user.
+        """
+        self.redis.set(f"{RECLAIM_PREFIX}{user_id}", 1, px=int(self.ttl_seconds * 1000))
+
+    def _reclaim_requested(self, user_ids) -> set:
+        if not user_ids:
+            return set()
+        pipe = self.redis.pipeline(transaction=False)
+        for uid in user_ids:
+            pipe.exists(f"{RECLAIM_PREFIX}{uid}")
+        return {uid for uid, flagged in zip(user_ids, pipe.execute()) if flagged}
+
+    def release_expired(self) -> int:
+        """Return unused credits of expired or reclaimed leases to Redis."""
+        now = time.time()
+        with self._lock:
+            held = list(self._leases)
+        try:
+            reclaimed = self._reclaim_requested(held)
+        except Exception as e:
+            print("credit lease reclaim check error", e)
+            reclaimed = set()
+        with self._lock:
+            expired = {
+                uid: l.remaining
+                for uid, l in self._leases.items()
+                if l.expires_at <= now or uid in reclaimed
+            }
+            for uid in expired:
+                del self._leases[uid]
+        for uid, remaining in expired.items():
+            self._return(uid, remaining)
+        return sum(expired.values())
+
+    def release_all(self) -> int:
+        """Return every unused leased credit to Redis (on shutdown)."""
+        with self._lock:
+            leases = {uid: l.remaining for uid, l in self._leases.items()}
+            self._leases.clear()
+        for uid, remaining in leases.items():
+            self._return(uid, remaining)
+        return sum(leases.values())
+
+    def start_sweeper(self, interval_seconds: float) -> threading.Event:
+        """Periodically release expired and reclaimed leases; set the returned event to stop."""
+        stop = threading.Event()
+
+        def sweep():
+            while not stop.wait(interval_seconds):
+                try:
+                    self.release_expired()
+                except Exception as e:
+                    print("credit lease sweeper error", e)
+
+        threading.Thread(target=sweep, daemon=True).start()
+        return stop
@@ -0,0 +1,268 @@
+"""Shared query planning for the ClickHouse-backed search endpoints.
+
+`/search` and `/download` accept the same filter set. This module turns those
+raw parameters into a canonical, hashable `SearchFilters` object and renders
+memoized SQL templates per filter shape, so identical filter sets always
+produce identical SQL text and both endpoints share one plan.
+
+When the materialized rollups from `sql/clickhouse_rollups.sql` exist, plans
+whose filter set matches a rollup are routed to it automatically.
+"""
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import AbstractSet, Any, Dict, Optional, Tuple
+
+PERSONS_TABLE = "analytics.persons_ingested"
+# Materialized rollups (see sql/clickhouse_rollups.sql)
+PERSONS_BY_COUNTRY_TABLE = "analytics.persons_by_country"
+COUNTRY_TITLE_COUNTS_TABLE = "analytics.persons_country_title_counts"
+FACETS_TABLE = "analytics.persons_facets"
+ROLLUP_TABLES = (PERSONS_BY_COUNTRY_TABLE, COUNTRY_TITLE_COUNTS_TABLE, FACETS_TABLE)
+# Base-table rows each rollup accounts for; a rollup is only routed to when
+# this equals count() of PERSONS_TABLE (i.e. it has been backfilled)
+ROLLUP_ROW_COUNT_SQL = {
+    PERSONS_BY_COUNTRY_TABLE: f"SELECT count() FROM {PERSONS_BY_COUNTRY_TABLE}",
+    COUNTRY_TITLE_COUNTS_TABLE: f"SELECT sum(row_count) FROM {COUNTRY_TITLE_COUNTS_TABLE}",
+    FACETS_TABLE: f"SELECT countMerge(row_count) FROM {FACETS_TABLE}",
+}
+SEARCH_COLUMNS = ["id", "person_name", "person_title", "person_email", "score"]
+ORDER_BY_SQL = " ORDER BY score DESC NULLS LAST, person_name ASC"
+
+# Predicate templates ranked most selective / cheapest first: the country
+# equality prunes the most rows, numeric range checks are cheap, and the
+# substring scans over free text run last on whatever survives.
+PREDICATES: Tuple[Tuple[str, str], ...] = (
+    ("country", "person_location_country = %(country)s"),
+    ("score_min", "toInt64OrNull(score) >= %(score_min)s"),
+    ("score_max", "toInt64OrNull(score) <= %(score_max)s"),
+    ("email_domain", "person_email LIKE %(email_pat)s"),
+    ("title", "positionCaseInsensitive(person_title, %(title)s) > 0"),
+    (
+        "term",
+        "(positionCaseInsensitive(person_name, %(term)s) > 0 OR positionCaseInsensitive(person_title, %(term)s) > 0)",
+    ),
+)
+_PREDICATE_SQL = dict(PREDICATES)
+
+# Facet name -> (expression over persons_ingested, column in the facets rollup)
+FACETS: Dict[str, Tuple[str, str]] = {
+    "country": ("ifNull(person_location_country, '')", "person_location_country"),
+    "seniority": ("ifNull(person_seniority, '')", "person_seniority"),
+    "title_normalized": ("ifNull(person_title_normalized, '')", "person_title_normalized"),
+    "email_domain": (
+        "if(position(ifNull(person_email, ''), '@') > 0, splitByChar('@', ifNull(person_email, ''))[-1], '')",
+        "email_domain",
+    ),
+}
+# Filters the facets rollup can answer exactly, with their rollup predicates
+_FACET_ROLLUP_PREDICATES = {
+    "country": "person_location_country = %(country)s",
+    "email_domain": "email_domain = %(email_domain)s",
+}
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    """Canonical filter set shared by `/search` and `/download`.
+
+    Instances are immutable and hashable, so they can be used directly as
+    cache keys; inactive filters are always normalized to ``None``.
+    """
+
+    term: Optional[str] = None
+    title: Optional[str] = None
+    country: Optional[str] = None
+    email_domain: Optional[str] = None
+    score_min: Optional[int] = None
+    score_max: Optional[int] = None
+
+    @classmethod
+    def from_params(
+        cls,
+        q: Optional[str] = None,
+        title: Optional[str] = None,
+        country: Optional[str] = None,
+        email_domain: Optional[str] = None,
+        score_min: Optional[int] = None,
+        score_max: Optional[int] = None,
+    ) -> "SearchFilters":
+        """Normalize raw query parameters into a canonical filter set."""
+        return cls(
+            term=(q or "").strip() or None,
+            title=title or None,
+            country=country or None,
+            email_domain=email_domain or None,
+            score_min=int(score_min) if score_min is not None else None,
+            score_max=int(score_max) if score_max is not None else None,
+        )
+
+    @property
+    def shape(self) -> Tuple[str, ...]:
+        """Names of the active filters, in predicate rank order."""
+        return tuple(name for name, _ in PREDICATES if getattr(self, name) is not None)
+
+    def params(self) -> Dict[str, Any]:
+        """Bind parameters for the active filters."""
+        params: Dict[str, Any] = {}
+        for name in self.shape:
+            if name == "email_domain":
+                # Match emails ending with the given domain; the LIKE pattern
+                # is built here to avoid ClickHouse concat quirks
+                params["email_pat"] = "%@" + self.email_domain
+            else:
+                params[name] = getattr(self, name)
+        return params
+
+    def cache_key(self) -> str:
+        """Stable string form of the filter set, suitable for external caches."""
+        return "|".join(f"{f.name}={getattr(self, f.name)!r}" for f in fields(self))
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    """SQL text and bind parameters for one request."""
+
+    filters: SearchFilters
+    sql: str
+    params: Dict[str, Any]
+    count_sql: Optional[str] = None
+
+
+@lru_cache(maxsize=None)
+def where_sql(shape: Tuple[str, ...]) -> str:
+    """Render the WHERE clause for a filter shape (empty when unfiltered)."""
+    if not shape:
+        return ""
+    return " WHERE " + " AND ".join(_PREDICATE_SQL[name] for name in shape)
+
+
+def _rows_source(shape: Tuple[str, ...], rollups: AbstractSet[str]) -> str:
+    # The country-sorted copy holds every search column, so any filter set
+    # that pins a country can be answered from that country's key range
+    if "country" in shape and PERSONS_BY_COUNTRY_TABLE in rollups:
+        return PERSONS_BY_COUNTRY_TABLE
+    return PERSONS_TABLE
+
+
+@lru_cache(maxsize=None)
+def _page_sql(shape: Tuple[str, ...], table: str) -> str:
+    return (
+        f"SELECT {', '.join(SEARCH_COLUMNS)} FROM {table}"
+        + where_sql(shape)
+        + ORDER_BY_SQL
+        + " LIMIT %(limit)s OFFSET %(offset)s"
+    )
+
+
+@lru_cache(maxsize=None)
+def _count_sql(shape: Tuple[str, ...], rollups: AbstractSet[str]) -> str:
+    if shape == ("country",) and COUNTRY_TITLE_COUNTS_TABLE in rollups:
+        return f"SELECT sum(row_count) FROM {COUNTRY_TITLE_COUNTS_TABLE}" + where_sql(shape)
+    return f"SELECT count() FROM {_rows_source(shape, rollups)}" + where_sql(shape)
+
+
+@lru_cache(maxsize=None)
+def _download_sql(shape: Tuple[str, ...], table: str) -> str:
+    return (
+        f"SELECT {', '.join(SEARCH_COLUMNS)} FROM {table}"
+        + where_sql(shape)
+        + ORDER_BY_SQL
+        + " LIMIT %(limit)s"
+    )
+
+
+def plan_search(
+    filters: SearchFilters,
+    limit: int,
+    offset: int,
+    rollups: AbstractSet[str] = frozenset(),
+) -> QueryPlan:
+    """Plan the paginated page query plus its total-count query.
+
+    ``rollups`` is the set of rollup tables known to exist; matching filter
+    sets are routed to them.
+    """
+    shape = filters.shape
+    rollups = frozenset(rollups)
+    params = filters.params()
+    params.update({"limit": limit, "offset": offset})
+    return QueryPlan(
+        filters=filters,
+        sql=_page_sql(shape, _rows_source(shape, rollups)),
+        params=params,
+        count_sql=_count_sql(shape, rollups),
+    )
+
+
+def plan_download(
+    filters: SearchFilters,
+    limit: int,
+    rollups: AbstractSet[str] = frozenset(),
+) -> QueryPlan:
+    """Plan the unpaginated CSV export query."""
+    shape = filters.shape
+    params = filters.params()
+    params["limit"] = limit
+    return QueryPlan(
+        filters=filters,
+        sql=_download_sql(shape, _rows_source(shape, frozenset(rollups))),
+        params=params,
+    )
+
+
+def _facets_from_rollup(filters: SearchFilters, rollups: AbstractSet[str]) -> bool:
+    if FACETS_TABLE not in rollups:
+        return False
+    if not set(filters.shape) <= set(_FACET_ROLLUP_PREDICATES):
+        return False
+    # LIKE wildcards in the domain would not match the rollup's exact domain
+    return not (filters.email_domain and any(c in filters.email_domain for c in "%_\\"))
+
+
+@lru_cache(maxsize=None)
+def _facets_sql(shape: Tuple[str, ...], facets: Tuple[str, ...], from_rollup: bool) -> str:
+    if from_rollup:
+        pairs = ", ".join(f"('{name}', {FACETS[name][1]})" for name in facets)
+        source = FACETS_TABLE
+        where = " AND ".join(_FACET_ROLLUP_PREDICATES[name] for name in shape)
+        where = " WHERE " + where if where else ""
+        count = "countMerge(row_count)"
+    else:
+        pairs = ", ".join(f"('{name}', {FACETS[name][0]})" for name in facets)
+        source = PERSONS_TABLE
+        where = where_sql(shape)
+        count = "count()"
+    # Every row contributes one (facet, value) pair per facet, so the window
+    # sum per facet is the total number of matching rows
+    return (
+        f"SELECT pair.1 AS facet, pair.2 AS value, {count} AS cnt,"
+        " sum(cnt) OVER (PARTITION BY facet) AS total"
+        f" FROM {source} ARRAY JOIN [{pairs}] AS pair"
+        + where
+        + " GROUP BY facet, value"
+        " ORDER BY facet, cnt DESC, value ASC"
+        " LIMIT %(k)s BY facet"
+    )
+
+
+def plan_facets(
+    filters: SearchFilters,
+    facets: Tuple[str, ...],
+    k: int,
+    rollups: AbstractSet[str] = frozenset(),
+) -> QueryPlan:
+    """Plan a single top-k value count query over the requested facets.
+
+    Filter sets that only pin country and/or email domain are answered from
+    the facets rollup; anything else aggregates over the base table.
+    """
+    from_rollup = _facets_from_rollup(filters, frozenset(rollups))
+    params = filters.params()
+    if from_rollup and filters.email_domain:
+        params["email_domain"] = params.pop("email_pat")[2:]
+    params["k"] = k
+    return QueryPlan(
+        filters=filters,
+        sql=_facets_sql(filters.shape, tuple(facets), from_rollup),
+        params=params,
+    )
@@ -0,0 +1,155 @@
+"""Request coalescing ("single-flight") for identical concurrent queries.
+
+Callers that ask for the same key while a call is in flight wait for that
+call and share its result instead of running their own. Nothing is cached:
+once the call returns, the next caller starts a fresh one, so results are
+never staler than an uncoalesced query would be.
+
+`SingleFlight` coalesces within one worker process. `RedisSingleFlight`
+additionally coalesces across workers: the first worker takes a Redis lock
+and publishes its result on a channel that the other workers wait on.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Optional
+
+import orjson
+
+from src.api.breaker import CircuitBreaker, CircuitOpenError
+
+# Delete the lock only if we still own it
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """In-process single-flight group keyed by string."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class RedisSingleFlight:
+    """Single-flight within the process and across workers through Redis.
+
+    Results must be JSON-serializable (tuples come back as lists). If Redis
+    is unavailable, or the leader does not publish within ``wait_seconds``,
+    the caller runs the query itself. With a ``breaker``, Redis calls go
+    through it, and while it is open coalescing stays within the process
+    instead of waiting out a Redis timeout per query.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        wait_seconds: float = 10.0,
+        lock_ttl_seconds: float = 30.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.redis = redis_client
+        self.wait_seconds = wait_seconds
+        self.lock_ttl_ms = int(lock_ttl_seconds * 1000)
+        self.breaker = breaker
+        self._local = SingleFlight()
+        self._release = redis_client.register_script(_RELEASE_LUA)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        return self._local.do(key, lambda: self._do_shared(key, fn))
+
+    def _guard(self):
+        return self.breaker.guard() if self.breaker is not None else nullcontext()
+
+    def _do_shared(self, key: str, fn: Callable[[], Any]) -> Any:
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        lock_key, channel = f"sf:lock:{digest}", f"sf:done:{digest}"
+        token = uuid.uuid4().hex
+        try:
+            with self._guard():
+                leader = self.redis.set(lock_key, token, nx=True, px=self.lock_ttl_ms)
+        except CircuitOpenError:
+            return fn()
+        except Exception as e:
+            print("single-flight lock error", e)
+            return fn()
+
+        if leader:
+            try:
+                result = fn()
+                try:
+                    with self._guard():
+                        self.redis.publish(channel, orjson.dumps(result))
+                except CircuitOpenError:
+                    pass
+                except Exception as e:
+                    print("single-flight publish error", e)
+                return result
+            finally:
+                try:
+                    with self._guard():
+                        self._release(keys=[lock_key], args=[token])
+                except Exception:
+                    pass
+
+        pubsub = None
+        try:
+            with self._guard():
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+                deadline = time.monotonic() + self.wait_seconds
+                # The leader may have finished before we subscribed; the lock
+                # disappearing without a message means we run the query ourselves
+                while self.redis.exists(lock_key):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    msg = pubsub.get_message(timeout=min(remaining, 0.5))
+                    if msg and msg["type"] == "message":
+                        return orjson.loads(msg["data"])
+        except CircuitOpenError:
+            pass
+        except Exception as e:
+            print("single-flight wait error", e)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+        return fn()
@@ -0,0 +1,116 @@
+"""Request-log mirroring to ClickHouse and usage queries over its rollups.
+
+`ApiLogBuffer` batches request log rows in memory and inserts them into
+`analytics.api_logs` from a background thread, so the request path never
+waits on ClickHouse. The `api_usage_hourly` materialized view (see
+`sql/clickhouse_api_logs.sql`) rolls them up per user, endpoint and hour;
+`usage_sql` renders the queries behind `/usage` and `/admin/usage`.
+"""
+import threading
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Optional
+
+API_LOGS_TABLE = "analytics.api_logs"
+API_USAGE_TABLE = "analytics.api_usage_hourly"
+INSERT_SQL = (
+    f"INSERT INTO {API_LOGS_TABLE} "
+    "(created_at, user_id, endpoint, credits_used, query_params, execution_time_ms, client_ip) VALUES"
+)
+
+
+class ApiLogBuffer:
+    """Bounded in-memory batch of api_logs rows flushed to ClickHouse."""
+
+    def __init__(
+        self,
+        get_client: Callable,
+        batch_size: int = 1000,
+        flush_interval: float = 2.0,
+        max_rows: int = 100000,
+    ) -> None:
+        self.get_client = get_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Oldest rows are dropped if ClickHouse is unreachable for long
+        self._rows: deque = deque(maxlen=max_rows)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(
+        self,
+        created_at: datetime,
+        user_id: int,
+        endpoint: str,
+        credits_used: int,
+        query_params: str,
+        exec_ms: int,
+        client_ip: Optional[str],
+    ) -> None:
+        with self._lock:
+            self._rows.append(
+                (created_at, user_id, endpoint, credits_used, query_params, max(exec_ms, 0), client_ip or "")
+            )
+            full = len(self._rows) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Insert everything buffered; rows are re-queued if the insert fails."""
+        with self._lock:
+            rows = list(self._rows)
+            self._rows.clear()
+        if not rows:
+            return 0
+        try:
+            self.get_client().execute(INSERT_SQL, rows)
+            return len(rows)
+        except Exception as e:
+            print(f"api_logs flush error ({len(rows)} rows):", e)
+            with self._lock:
+                # Re-queue ahead of rows added meanwhile; if that overflows,
+                # drop the oldest failed rows rather than the newest ones
+                room = self._rows.maxlen - len(self._rows)
+                if room < len(rows):
+                    print(f"api_logs buffer full, dropping {len(rows) - max(room, 0)} oldest rows")
+                    rows = rows[len(rows) - max(room, 0):]
+                self._rows.extendleft(reversed(rows))
+            return 0
+
+    def start(self) -> None:
+        def run():
+            while not self._stop.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self.flush()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flush thread and write out what is left."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+
+@lru_cache(maxsize=None)
+def usage_sql(by_user: bool, for_user: bool) -> str:
+    """Usage per endpoint (and per user when ``by_user``) over hours in [start, end)."""
+    keys = "user_id, endpoint" if by_user else "endpoint"
+    where = "hour >= %(start)s AND hour < %(end)s"
+    if for_user:
+        where += " AND user_id = %(user_id)s"
+    return (
+        f"SELECT {keys}, countMerge(requests) AS requests, sumMerge(credits) AS credits_used,"
+        " quantilesMerge(0.5, 0.95, 0.99)(latency_ms) AS latency,"
+        " topKMerge(10)(top_queries) AS top_queries"
+        f" FROM {API_USAGE_TABLE} WHERE {where}"
+        f" GROUP BY {keys} ORDER BY credits_used DESC, requests DESC"
+        " LIMIT %(limit)s"
+    )
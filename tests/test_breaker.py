@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from src.api.breaker import CircuitBreaker, CircuitOpenError
+
+
+def _fail(breaker):
+    with pytest.raises(ConnectionError):
+        with breaker.guard():
+            raise ConnectionError("down")
+
+
+def test_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker("redis", (ConnectionError,), failure_threshold=3, reset_timeout=60)
+    for _ in range(3):
+        _fail(breaker)
+    assert breaker.state == "open"
+
+    ran = []
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard():
+            ran.append(1)
+    assert ran == []
+
+
+def test_half_open_probe_closes_or_reopens():
+    breaker = CircuitBreaker("postgres", (ConnectionError,), failure_threshold=1, reset_timeout=0.05)
+    _fail(breaker)
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    _fail(breaker)
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    # Only one probe at a time while half-open
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.snapshot() == {"state": "closed", "consecutive_failures": 0}
+
+
+def test_application_errors_do_not_trip():
+    breaker = CircuitBreaker("clickhouse", (ConnectionError,), failure_threshold=1)
+    with pytest.raises(ValueError):
+        with breaker.guard():
+            raise ValueError("bad query")
+    assert breaker.state == "closed"
+
+
+def test_check_does_not_take_the_half_open_probe():
+    breaker = CircuitBreaker("clickhouse", (ConnectionError,), failure_threshold=1, reset_timeout=0.05)
+    _fail(breaker)
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    time.sleep(0.06)
+    breaker.check()
+    assert breaker.allow()
+    # The probe is in flight: further calls would be rejected, so check refuses them too
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.record_success()
+    breaker.check()
+
+
+def test_neutral_exceptions_neither_trip_nor_close():
+    breaker = CircuitBreaker(
+        "postgres", (ConnectionError,), failure_threshold=1, reset_timeout=0.05, neutral_exceptions=(LookupError,)
+    )
+    for _ in range(3):
+        with pytest.raises(LookupError):
+            with breaker.guard():
+                raise LookupError("pool exhausted")
+    assert breaker.state == "closed"
+
+    _fail(breaker)
+    time.sleep(0.06)
+    with pytest.raises(LookupError):
+        with breaker.guard():
+            raise LookupError("pool exhausted")
+    # Still half-open, and the probe slot is free again
+    assert breaker.state == "half_open"
+    assert breaker.allow()
@@ -0,0 +1,120 @@
+import gzip
+
+import brotli
+import pytest
+import zstandard
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from src.api.compression import CompressionMiddleware, choose_encoding
+
+AVAILABLE = ("zstd", "br", "gzip")
+BODY = "x" * 2048
+
+
+def test_choose_encoding_prefers_server_order_on_equal_weight():
+    assert choose_encoding("gzip, br, zstd", AVAILABLE) == "zstd"
+    assert choose_encoding("gzip, br", AVAILABLE) == "br"
+    assert choose_encoding("", AVAILABLE) is None
+
+
+def test_choose_encoding_honours_q_values():
+    assert choose_encoding("zstd;q=0.5, gzip;q=0.8", AVAILABLE) == "gzip"
+    assert choose_encoding("gzip;q=0, br;q=0", AVAILABLE) is None
+    assert choose_encoding("GZIP;q=1.0", AVAILABLE) == "gzip"
+    assert choose_encoding("gzip;q=oops, br", AVAILABLE) == "br"
+
+
+def test_choose_encoding_wildcard():
+    assert choose_encoding("*", AVAILABLE) == "zstd"
+    assert choose_encoding("*;q=0.1, gzip", AVAILABLE) == "gzip"
+    assert choose_encoding("zstd;q=0, *", AVAILABLE) == "br"
+    assert choose_encoding("*;q=0", AVAILABLE) is None
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse(BODY)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("tiny")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([BODY, BODY]), media_type="text/csv")
+
+    @app.get("/binary")
+    def binary():
+        return PlainTextResponse(BODY, media_type="application/octet-stream")
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "encoding, decompress",
+    [
+        ("gzip", gzip.decompress),
+        ("br", brotli.decompress),
+        ("zstd", lambda data: zstandard.ZstdDecompressor().decompress(data)),
+    ],
+)
+def test_large_body_is_compressed(client, encoding, decompress):
+    with client.stream("GET", "/big", headers={"Accept-Encoding": encoding}) as resp:
+        # Raw bytes as sent, before the client decodes them
+        raw = b"".join(resp.iter_raw())
+    assert resp.headers["content-encoding"] == encoding
+    assert resp.headers["content-length"] == str(len(raw))
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert decompress(raw).decode() == BODY
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [("/small", "tiny"), ("/stream", BODY * 2), ("/binary", BODY)],
+)
+def test_ineligible_responses_pass_through(client, path, expected):
+    resp = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert "content-encoding" not in resp.headers
+    assert resp.text == expected
+
+
+def test_no_accepted_encoding_passes_through(client):
+    resp = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in resp.headers
+    assert resp.headers["content-length"] == str(len(BODY))
+
+
+def test_large_bodies_are_compressed_off_the_event_loop(monkeypatch):
+    import anyio.to_thread
+
+    offloaded = []
+    run_sync = anyio.to_thread.run_sync
+
+    async def recording_run_sync(fn, *args, **kwargs):
+        offloaded.append(len(args[0]))
+        return await run_sync(fn, *args, **kwargs)
+
+    monkeypatch.setattr(anyio.to_thread, "run_sync", recording_run_sync)
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, threadpool_min_size=2048)
+
+    @app.get("/big")
+    async def big():
+        return PlainTextResponse(BODY)
+
+    @app.get("/medium")
+    async def medium():
+        return PlainTextResponse(BODY[:1500])
+
+    client = TestClient(app)
+    assert client.get("/big", headers={"Accept-Encoding": "gzip"}).text == BODY
+    assert client.get("/medium", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+    assert offloaded == [len(BODY)]
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from src.api.credit_lease import CreditLeaseManager
+
+
+@pytest.fixture
+def r():
+    return fakeredis.FakeRedis()
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_concurrent_spend_never_exceeds_balance(r):
+    r.set("credits:1", 1000)
+    workers = [CreditLeaseManager(r, block=50, ttl_seconds=30, low_watermark=10) for _ in range(4)]
+    spent = []
+    lock = threading.Lock()
+
+    def spend(manager):
+        n = 0
+        for _ in range(400):
+            if manager.try_consume(1):
+                n += 1
+        with lock:
+            spent.append(n)
+
+    threads = [threading.Thread(target=spend, args=(m,)) for m in workers for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for m in workers:
+        m.release_all()
+    # Only full blocks are leased; whatever was not leased or spent is back in Redis
+    assert sum(spent) + int(r.get("credits:1")) == 1000
+    assert sum(spent) <= 1000
+
+
+def test_balance_below_block_is_not_leased(r):
+    r.set("credits:1", 49)
+    manager = CreditLeaseManager(r, block=50)
+    assert manager.try_consume(1) is False
+    assert int(r.get("credits:1")) == 49
+    assert manager.try_consume(2) is False  # missing key
+
+
+def test_refill_tops_up_before_running_out(r):
+    r.set("credits:1", 200)
+    manager = CreditLeaseManager(r, block=50, low_watermark=10)
+    for _ in range(40):
+        assert manager.try_consume(1)
+    # The 40th spend hit the watermark and started a background refill
+    assert _wait_for(lambda: int(r.get("credits:1")) == 100)
+    assert manager.try_consume_local(1, 60)
+
+
+def test_expired_lease_is_returned(r):
+    r.set("credits:1", 100)
+    manager = CreditLeaseManager(r, block=50, ttl_seconds=0.05, low_watermark=0)
+    assert manager.try_consume(1, 5)
+    assert int(r.get("credits:1")) == 50
+    time.sleep(0.06)
+    assert manager.release_expired() == 45
+    assert int(r.get("credits:1")) == 95
+    assert manager.try_consume_local(1) is False
+
+
+def test_release_all_returns_every_lease(r):
+    r.set("credits:1", 100)
+    r.set("credits:2", 60)
+    manager = CreditLeaseManager(r, block=50, low_watermark=0)
+    assert manager.try_consume(1, 10) and manager.try_consume(2, 20)
+    assert manager.release_all() == 40 + 30
+    assert int(r.get("credits:1")) == 90
+    assert int(r.get("credits:2")) == 40
+
+
+def test_reclaim_returns_credits_stranded_in_another_worker(r):
+    r.set("credits:1", 60)
+    a = CreditLeaseManager(r, block=50, low_watermark=0)
+    b = CreditLeaseManager(r, block=50, low_watermark=0)
+    assert a.try_consume(1, 10)
+    # 10 left in Redis: too few for b to lease, so b uses the per-request path
+    assert b.try_consume(1) is False
+    assert a.release_expired() == 0
+    b.request_reclaim(1)
+    assert a.release_expired() == 40
+    assert int(r.get("credits:1")) == 50
+
+
+def test_grants_and_returns_report_the_redis_balance(r):
+    r.set("credits:1", 100)
+    seen = []
+    manager = CreditLeaseManager(r, block=50, low_watermark=0, on_balance=lambda uid, bal: seen.append((uid, bal)))
+    assert manager.try_consume(1, 10)
+    manager.release_all()
+    # Postgres would be mirrored to 50 on the grant and back to 90 on the return
+    assert seen == [(1, 50), (1, 90)]
@@ -0,0 +1,117 @@
+import fakeredis
+import pytest
+
+import src.api.app as api
+from src.api.breaker import CircuitBreaker
+from src.api.credit_lease import CreditLeaseManager
+
+
+@pytest.fixture
+def leases(monkeypatch):
+    r = fakeredis.FakeRedis()
+    manager = CreditLeaseManager(r, block=50, ttl_seconds=30, low_watermark=0)
+    breaker = CircuitBreaker("redis", (ConnectionError,), failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(api, "redis_client", r)
+    monkeypatch.setattr(api, "credit_leases", manager)
+    monkeypatch.setattr(api, "redis_breaker", breaker)
+    monkeypatch.setattr(api, "mirror_balance_to_postgres", lambda user_id, balance: None)
+    return r, manager, breaker
+
+
+def test_leased_credits_are_spent_while_redis_breaker_is_open(leases):
+    r, manager, breaker = leases
+    r.set("credits:1", 100)
+    assert api.try_consume_credits(1)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    # The remaining 49 leased credits need no Redis and no Postgres fallback
+    assert all(api.try_consume_credits(1) for _ in range(49))
+    assert breaker.snapshot() == {"state": "open", "consecutive_failures": 1}
+
+
+def test_local_lease_hit_does_not_count_as_redis_probe(leases, monkeypatch):
+    r, manager, breaker = leases
+    r.set("credits:1", 100)
+    assert api.try_consume_credits(1)
+    breaker.record_failure()
+    monkeypatch.setattr(breaker, "reset_timeout", 0)
+    assert breaker.state == "half_open"
+    assert api.try_consume_credits(1)
+    assert breaker.state == "half_open"
+
+
+@pytest.mark.parametrize("path", ["/search?q=x", "/download?q=x", "/person/abc", "/facets"])
+def test_no_charge_while_clickhouse_breaker_is_open(monkeypatch, path):
+    from fastapi.testclient import TestClient
+
+    charged = []
+    breaker = CircuitBreaker("clickhouse", (ConnectionError,), failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    monkeypatch.setattr(api, "ch_breaker", breaker)
+    monkeypatch.setattr(api, "redis_client", fakeredis.FakeRedis())
+    monkeypatch.setattr(api, "authenticate", lambda request: 1)
+    monkeypatch.setattr(api, "try_consume_credits", lambda user_id, amount=1: charged.append(amount) or True)
+
+    resp = TestClient(api.app).get(path, headers={"x-api-key": "k"})
+    assert resp.status_code == 503
+    assert resp.json() == {"detail": "clickhouse temporarily unavailable"}
+    assert charged == []
+
+
+def test_usage_maps_open_clickhouse_breaker_to_503(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    breaker = CircuitBreaker("clickhouse", (ConnectionError,), failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    monkeypatch.setattr(api, "ch_breaker", breaker)
+    monkeypatch.setattr(api, "authenticate", lambda request: 1)
+
+    client = TestClient(api.app)
+    assert client.get("/usage", headers={"x-api-key": "k"}).status_code == 503
+    assert client.get("/admin/usage", headers={"x-admin-secret": api.ADMIN_SECRET}).status_code == 503
+
+
+def test_health_is_not_ok_while_a_breaker_is_open(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    breaker = CircuitBreaker("postgres", (ConnectionError,), failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(api, "pg_breaker", breaker)
+    monkeypatch.setitem(api._health_status, "postgres", True)
+    monkeypatch.setitem(api._health_status, "redis", True)
+    monkeypatch.setitem(api._health_status, "clickhouse", True)
+    client = TestClient(api.app)
+    assert client.get("/health").json()["ok"] is True
+
+    breaker.record_failure()
+    body = client.get("/health").json()
+    assert body["ok"] is False
+    assert body["breakers"]["postgres"]["state"] == "open"
+
+
+def test_pool_exhaustion_waits_then_fails_without_tripping_breaker(monkeypatch):
+    import threading
+
+    import psycopg2.pool
+
+    class FakePool:
+        def getconn(self):
+            return object()
+
+        def putconn(self, conn):
+            pass
+
+    breaker = CircuitBreaker(
+        "postgres", (ConnectionError,), failure_threshold=1, neutral_exceptions=(psycopg2.pool.PoolError,)
+    )
+    monkeypatch.setattr(api, "pg_pool", FakePool())
+    monkeypatch.setattr(api, "pg_pool_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(api, "PG_POOL_WAIT_SECONDS", 0.01)
+    monkeypatch.setattr(api, "pg_breaker", breaker)
+
+    held = api.get_pg_conn()
+    with pytest.raises(api.HTTPException) as exc:
+        api.validate_api_key("uncached-key")
+    assert exc.value.status_code == 503
+    assert breaker.state == "closed"
+    api.release_pg_conn(held)
+    assert api.get_pg_conn() is not None
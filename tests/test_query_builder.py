@@ -0,0 +1,85 @@
+from src.api.query_builder import ROLLUP_TABLES, SearchFilters, plan_download, plan_facets, plan_search
+
+
+def test_filters_are_canonical_cache_keys():
+    a = SearchFilters.from_params(q="  Acme ", country="India", title="")
+    b = SearchFilters.from_params(q="Acme", country="India")
+    assert a == b
+    assert hash(a) == hash(b)
+    assert a.cache_key() == b.cache_key()
+
+
+def test_country_predicate_runs_first():
+    f = SearchFilters.from_params(q="Acme", title="Engineer", country="India", score_min=10)
+    assert f.shape == ("country", "score_min", "title", "term")
+    plan = plan_search(f, limit=10, offset=20)
+    where = plan.sql.split(" WHERE ", 1)[1]
+    assert where.startswith("person_location_country = %(country)s AND ")
+    assert plan.params == {
+        "country": "India",
+        "score_min": 10,
+        "title": "Engineer",
+        "term": "Acme",
+        "limit": 10,
+        "offset": 20,
+    }
+
+
+def test_same_shape_reuses_identical_sql():
+    p1 = plan_search(SearchFilters.from_params(country="India"), 50, 0)
+    p2 = plan_search(SearchFilters.from_params(country="Peru"), 50, 50)
+    assert p1.sql is p2.sql
+    assert p1.count_sql is p2.count_sql
+    assert p1.count_sql == "SELECT count() FROM analytics.persons_ingested WHERE person_location_country = %(country)s"
+
+
+def test_download_shares_where_clause():
+    f = SearchFilters.from_params(email_domain="gmail.com")
+    search = plan_search(f, 5, 0)
+    download = plan_download(f, 5)
+    assert download.params == {"email_pat": "%@gmail.com", "limit": 5}
+    assert download.sql.endswith(" LIMIT %(limit)s")
+    assert search.sql.split(" ORDER BY ")[0] == download.sql.split(" ORDER BY ")[0]
+
+
+def test_unfiltered_plan_has_no_where():
+    plan = plan_search(SearchFilters.from_params(), 50, 0)
+    assert " WHERE " not in plan.sql
+    assert plan.count_sql == "SELECT count() FROM analytics.persons_ingested"
+
+
+def test_country_filters_route_to_rollups():
+    rollups = frozenset(ROLLUP_TABLES)
+    plan = plan_search(SearchFilters.from_params(country="India"), 50, 0, rollups)
+    assert " FROM analytics.persons_by_country WHERE " in plan.sql
+    assert plan.count_sql.startswith("SELECT sum(row_count) FROM analytics.persons_country_title_counts")
+
+    plan = plan_search(SearchFilters.from_params(country="India", title="Engineer"), 50, 0, rollups)
+    assert " FROM analytics.persons_by_country WHERE " in plan.sql
+    assert plan.count_sql.startswith("SELECT count() FROM analytics.persons_by_country")
+
+
+def test_no_rollup_routing_without_country_or_tables():
+    plan = plan_search(SearchFilters.from_params(title="Engineer"), 50, 0, frozenset(ROLLUP_TABLES))
+    assert " FROM analytics.persons_ingested" in plan.sql
+    plan = plan_download(SearchFilters.from_params(country="India"), 5)
+    assert " FROM analytics.persons_ingested" in plan.sql
+
+
+def test_facets_use_rollup_for_country_and_domain_filters():
+    f = SearchFilters.from_params(country="India", email_domain="gmail.com")
+    plan = plan_facets(f, ("country", "seniority"), 5, frozenset(ROLLUP_TABLES))
+    assert " FROM analytics.persons_facets " in plan.sql
+    assert "countMerge(row_count)" in plan.sql
+    assert plan.params == {"country": "India", "email_domain": "gmail.com", "k": 5}
+
+
+def test_facets_fall_back_to_base_table():
+    rollups = frozenset(ROLLUP_TABLES)
+    plan = plan_facets(SearchFilters.from_params(country="India", title="CTO"), ("country",), 5, rollups)
+    assert " FROM analytics.persons_ingested " in plan.sql
+    assert plan.params == {"country": "India", "title": "CTO", "k": 5}
+    # A LIKE wildcard cannot be answered by the exact-domain rollup
+    plan = plan_facets(SearchFilters.from_params(email_domain="%.edu"), ("country",), 5, rollups)
+    assert " FROM analytics.persons_ingested " in plan.sql
+    assert plan.params["email_pat"] == "%@%.edu"
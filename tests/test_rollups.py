@@ -0,0 +1,31 @@
+import src.api.app as api
+from src.api.query_builder import COUNTRY_TITLE_COUNTS_TABLE, FACETS_TABLE, PERSONS_BY_COUNTRY_TABLE, ROLLUP_ROW_COUNT_SQL
+
+
+class FakeClickHouse:
+    def __init__(self, base_rows, rollup_rows):
+        self.base_rows = base_rows
+        self.rollup_rows = rollup_rows
+
+    def execute(self, sql, *args, **kwargs):
+        if sql.startswith("SELECT concat"):
+            return [(t,) for t in self.rollup_rows] + [("analytics.persons_ingested",)]
+        for table, count_sql in ROLLUP_ROW_COUNT_SQL.items():
+            if sql == count_sql:
+                return [(self.rollup_rows[table],)]
+        return [(self.base_rows,)]
+
+
+def test_detect_rollups_skips_rollups_that_need_backfill(monkeypatch):
+    fake = FakeClickHouse(
+        1000,
+        {PERSONS_BY_COUNTRY_TABLE: 1000, COUNTRY_TITLE_COUNTS_TABLE: 12, FACETS_TABLE: 1000},
+    )
+    monkeypatch.setattr(api, "get_ch_client", lambda: fake)
+    assert api.detect_rollups() == frozenset({PERSONS_BY_COUNTRY_TABLE, FACETS_TABLE})
+
+
+def test_detect_rollups_treats_empty_sum_as_zero(monkeypatch):
+    fake = FakeClickHouse(0, {COUNTRY_TITLE_COUNTS_TABLE: None})
+    monkeypatch.setattr(api, "get_ch_client", lambda: fake)
+    assert api.detect_rollups() == frozenset({COUNTRY_TITLE_COUNTS_TABLE})
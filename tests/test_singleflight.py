@@ -0,0 +1,79 @@
+import threading
+import time
+
+import fakeredis
+
+from src.api.breaker import CircuitBreaker
+from src.api.singleflight import RedisSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    group = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def query():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return [("id-1", "Ada")]
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(group.do("k", query)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(group.do("k", query))) for _ in range(5)]
+    for t in followers:
+        t.start()
+    for t in [leader, *followers]:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [[("id-1", "Ada")]] * 6
+
+
+def test_no_result_is_reused_after_completion():
+    group = SingleFlight()
+    assert group.do("k", lambda: 1) == 1
+    assert group.do("k", lambda: 2) == 2
+
+
+def test_errors_propagate_to_waiters():
+    group = SingleFlight()
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("clickhouse down")
+
+    errors = []
+
+    def call():
+        try:
+            group.do("k", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert errors == ["clickhouse down", "clickhouse down"]
+
+    # The failed call is not remembered; the next caller runs its own query
+    assert group.do("k", lambda: "recovered") == "recovered"
+
+
+def test_redis_single_flight_skips_redis_while_breaker_is_open():
+    class NoRedis(fakeredis.FakeRedis):
+        def set(self, *args, **kwargs):
+            raise AssertionError("Redis must not be called while the breaker is open")
+
+    breaker = CircuitBreaker("redis", (ConnectionError,), failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    group = RedisSingleFlight(NoRedis(), breaker=breaker)
+    assert group.do("k", lambda: [1, 2]) == [1, 2]
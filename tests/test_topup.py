@@ -0,0 +1,67 @@
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+
+import src.api.app as api
+
+
+@pytest.fixture
+def r(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(api, "redis_client", client)
+    monkeypatch.setattr(api, "redis_admin_client", client)
+    monkeypatch.setattr(api, "topup_script", client.register_script(api.TOPUP_LUA))
+    monkeypatch.setattr(api, "release_claim_script", client.register_script(api.RELEASE_CLAIM_LUA))
+    return client
+
+
+def _credit(r, uid, amount, applied_key=None):
+    keys, args = [f"credits:{uid}"], [amount, amount]
+    if applied_key:
+        keys.append(applied_key)
+        args += [uid, 60]
+    return api.topup_script(keys=keys, args=args)
+
+
+def test_topup_script_credits_each_user_once_per_request(r):
+    r.set("credits:1", 10)
+    assert _credit(r, 1, 5, "topup:bulk:a:applied") == [15, 1]
+    # A retry of the same request after a partial failure skips user 1
+    assert _credit(r, 1, 5, "topup:bulk:a:applied") == [15, 0]
+    assert _credit(r, 2, 7, "topup:bulk:a:applied") == [7, 1]
+    assert int(r.get("credits:1")) == 15
+    # Without a request hash every call credits
+    assert _credit(r, 1, 5) == [20, 1]
+
+
+def test_failed_bulk_request_can_be_retried(r, monkeypatch):
+    calls = []
+
+    def apply_topups(amounts, applied_key=None):
+        calls.append(applied_key)
+        if len(calls) == 1:
+            raise TimeoutError("reply timed out")
+        return {uid: 100 for uid in amounts}, []
+
+    monkeypatch.setattr(api, "apply_topups", apply_topups)
+    client = TestClient(api.app)
+    headers = {"x-admin-secret": api.ADMIN_SECRET}
+    body = {"request_id": "r1", "items": [{"user_id": 1, "amount": 5}]}
+
+    first = client.post("/admin/topup:bulk", json=body, headers=headers)
+    assert first.status_code == 500 and first.json()["retryable"]
+    # The claim was released, so the retry runs (idempotently) instead of getting 409
+    second = client.post("/admin/topup:bulk", json=body, headers=headers)
+    assert second.json()["replayed"] is False
+    third = client.post("/admin/topup:bulk", json=body, headers=headers)
+    assert third.json()["replayed"] is True
+    assert calls == ["topup:bulk:r1:applied"] * 2
+
+
+def test_in_flight_claim_returns_409_until_it_expires(r):
+    r.set("topup:bulk:r2:claim", "other-worker", ex=api.TOPUP_CLAIM_TTL_SECONDS)
+    client = TestClient(api.app)
+    body = {"request_id": "r2", "items": [{"user_id": 1, "amount": 5}]}
+    resp = client.post("/admin/topup:bulk", json=body, headers={"x-admin-secret": api.ADMIN_SECRET})
+    assert resp.status_code == 409
+    assert 0 < r.ttl("topup:bulk:r2:claim") <= api.TOPUP_CLAIM_TTL_SECONDS
@@ -0,0 +1,77 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from src.api.usage import INSERT_SQL, ApiLogBuffer, usage_sql
+
+
+class FakeClient:
+    def __init__(self):
+        self.fail = False
+        self.inserted = []
+
+    def execute(self, sql, rows):
+        if self.fail:
+            raise ConnectionError("clickhouse down")
+        assert sql == INSERT_SQL
+        self.inserted.extend(rows)
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+def _add(buffer, n, start=0):
+    now = datetime.now(timezone.utc)
+    for i in range(start, start + n):
+        buffer.add(now, i, "/search", 1, "{}", 5, None)
+
+
+def test_flush_inserts_buffered_rows(client):
+    buffer = ApiLogBuffer(lambda: client)
+    _add(buffer, 3)
+    assert buffer.flush() == 3
+    assert [row[1] for row in client.inserted] == [0, 1, 2]
+    # Missing client ip is stored as an empty string
+    assert client.inserted[0][-1] == ""
+    assert buffer.flush() == 0
+
+
+def test_failed_flush_requeues_in_order(client):
+    buffer = ApiLogBuffer(lambda: client)
+    _add(buffer, 3)
+    client.fail = True
+    assert buffer.flush() == 0
+    _add(buffer, 2, start=3)
+    client.fail = False
+    assert buffer.flush() == 5
+    assert [row[1] for row in client.inserted] == [0, 1, 2, 3, 4]
+
+
+def test_requeue_into_full_buffer_drops_oldest(client):
+    buffer = ApiLogBuffer(lambda: client, max_rows=5)
+    _add(buffer, 4)
+
+    def fail_while_requests_arrive(sql, rows):
+        _add(buffer, 3, start=4)
+        raise ConnectionError("clickhouse down")
+
+    client.execute = fail_while_requests_arrive
+    assert buffer.flush() == 0
+    del client.execute
+    assert buffer.flush() == 5
+    assert [row[1] for row in client.inserted] == [2, 3, 4, 5, 6]
+
+
+def test_usage_sql_shapes():
+    per_user = usage_sql(True, False)
+    assert per_user.startswith("SELECT user_id, endpoint, countMerge(requests)")
+    assert "GROUP BY user_id, endpoint" in per_user
+    assert "user_id = %(user_id)s" not in per_user
+
+    own = usage_sql(False, True)
+    assert own.startswith("SELECT endpoint, ")
+    assert "AND user_id = %(user_id)s" in own
+    assert "hour >= %(start)s AND hour < %(end)s" in own
+    assert usage_sql(False, True) is own